@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+
+
+"""Bulk analysis of the stored game archive.
+
+Game documents are streamed from the games directory and analyzed in a
+process pool, one document per task, so no process ever holds more than a
+handful of games.  Each result is appended to a CSV summary as soon as it is
+ready; the summary doubles as the checkpoint, since games already in it
+(including those that could not be analyzed, marked ``skipped``) are not
+looked at again when a run is resumed.
+"""
+
+
+import csv
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from math import sqrt
+
+from generation import GameAnalyzer
+from generation import audit_game
+from generation import game_alphabet
+from generation import load_index
+
+
+COLUMNS = [
+    "id",
+    "status",
+    "samples",
+    "measures",
+    "contracts",
+    "difficulty",
+    "measure_value_mean",
+    "candidates_mean",
+    "candidates_max",
+    "contract_true_mean",
+    "contract_balance",
+    "best_score",
+    "plays",
+]
+
+
+def iter_game_paths(games_dir):
+    """Yield (id, path) of every stored game, without listing them all at once."""
+    with os.scandir(games_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or entry.name == "scores.log":
+                continue
+            if entry.is_file():
+                yield (entry.name, entry.path)
+
+
+def read_scores(scores_path):
+    """Best score and number of plays per game id, from ``scores.log``."""
+    scores = {}
+    try:
+        with open(scores_path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                (id_, score) = line.strip().split(" ", 1)
+                (best, plays) = scores.get(id_, (None, 0))
+                score = int(score)
+                best = score if best is None else max(best, score)
+                scores[id_] = (best, plays + 1)
+    except OSError:
+        pass
+    return scores
+
+
+def analyze_game(id_, path, alphabet, length):
+    """Summarize one stored game, or return None if it cannot be analyzed."""
+    try:
+        with open(path) as f:
+            game = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    measures = game.get("measures") or {}
+    contracts = game.get("contracts") or {}
+    if not measures:
+        return None
+    # Games do not record their alphabet, and one over other letters would be
+    # analyzed against the wrong universe
+    if game_alphabet(game) != alphabet.upper():
+        return None
+    if any(len(a) != length for a in game.get("answers", {}).values()):
+        return None
+
+    index = load_index(alphabet, length)
+    texts = sorted(set().union(*(m.keys() for m in measures.values())))
+    if any(text not in index.callables for text in texts):
+        return None
+    funcs = [index.callables[text] for text in texts]
+    analyzer = GameAnalyzer(alphabet, length, len(measures), len(contracts))
+
+    candidates = list(audit_game(game, alphabet, length).values())
+
+    contract_texts = sorted(
+        set().union(*(c.keys() for c in contracts.values()))
+    ) if contracts else []
+    true_fractions = [
+        sum(1 for c in contracts.values() if c.get(text) is True) / len(contracts)
+        for text in contract_texts
+    ]
+
+    return {
+        "id": id_,
+        "samples": len(measures),
+        "measures": len(texts),
+        "contracts": len(contract_texts),
+        "difficulty": analyzer.value(*funcs),
+        "measure_value_mean": _mean([analyzer.value(f) for f in funcs]),
+        "candidates_mean": _mean(candidates),
+        "candidates_max": max(candidates),
+        "contract_true_mean": _mean(true_fractions),
+        # 1 when every contract splits the samples evenly, 0 when none do
+        "contract_balance": _mean([1 - abs(2 * p - 1) for p in true_fractions]),
+    }
+
+
+def _analyze_task(args):
+    return (args[0], analyze_game(*args))
+
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+
+def pearson(xs, ys):
+    """Pearson correlation of two equally long lists, or None if undefined."""
+    n = len(xs)
+    if n < 2:
+        return None
+    (mx, my) = (sum(xs) / n, sum(ys) / n)
+    cov = sum((x - mx) * (y - my) for (x, y) in zip(xs, ys))
+    vx = sum((x - mx) ** 2 for x in xs)
+    vy = sum((y - my) ** 2 for y in ys)
+    if not vx or not vy:
+        return None
+    return cov / sqrt(vx * vy)
+
+
+def _done_ids(output):
+    try:
+        with open(output, newline="") as f:
+            return {row["id"] for row in csv.DictReader(f)}
+    except OSError:
+        return set()
+
+
+def _drop_partial_row(output):
+    """Cut off a last row left unfinished by a crash mid-write."""
+    try:
+        f = open(output, "r+b")
+    except FileNotFoundError:
+        return
+    with f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 64 * 1024)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                keep = start + newline + 1
+                break
+            position = start
+        else:
+            keep = 0
+        if keep != end:
+            f.truncate(keep)
+
+
+def analyze_corpus(games_dir, output, alphabet, length, workers=None):
+    """Analyze every game not yet in ``output``, appending a row for each.
+
+    Returns a summary of the whole output, including rows of earlier runs.
+    """
+    scores = read_scores(os.path.join(games_dir, "scores.log"))
+    _drop_partial_row(output)
+    done = _done_ids(output)
+    todo = (
+        (id_, path, alphabet, length)
+        for (id_, path) in iter_game_paths(games_dir)
+        if id_ not in done
+    )
+
+    workers = workers or os.cpu_count() or 1
+    new_file = not os.path.exists(output) or os.path.getsize(output) == 0
+    with open(output, "a", newline="") as f, ProcessPoolExecutor(workers) as pool:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        if new_file:
+            writer.writeheader()
+
+        # Keep only a bounded number of tasks in flight, so that the archive
+        # is streamed rather than submitted all at once
+        max_pending = 4 * workers
+        pending = set()
+        analyzed = skipped = 0
+        while True:
+            for args in todo:
+                pending.add(pool.submit(_analyze_task, args))
+                if len(pending) >= max_pending:
+                    break
+            if not pending:
+                break
+
+            (finished, pending) = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                (id_, row) = future.result()
+                if row is None:
+                    writer.writerow({"id": id_, "status": "skipped"})
+                    skipped += 1
+                    continue
+                (best, plays) = scores.get(id_, (None, 0))
+                writer.writerow(
+                    dict(row, status="ok", best_score=best, plays=plays)
+                )
+                analyzed += 1
+            f.flush()
+
+    return dict(summarize(output), analyzed=analyzed, skipped=skipped)
+
+
+def summarize(output):
+    """Corpus-wide figures from a summary file."""
+    with open(output, newline="") as f:
+        rows = [r for r in csv.DictReader(f) if r["status"] == "ok"]
+
+    scored = [r for r in rows if r["best_score"]]
+    difficulty = [float(r["difficulty"]) for r in scored]
+    candidates = [float(r["candidates_mean"]) for r in scored]
+    best = [float(r["best_score"]) for r in scored]
+
+    return {
+        "games": len(rows),
+        "scored_games": len(scored),
+        "difficulty_mean": _mean([float(r["difficulty"]) for r in rows]),
+        "difficulty_score_correlation": pearson(difficulty, best),
+        "candidates_score_correlation": pearson(candidates, best),
+    }
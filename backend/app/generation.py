@@ -0,0 +1,1067 @@
+#!/usr/bin/env python
+
+
+"""Game generation core: measurements, contracts and game assembly.
+
+This is all the API needs, so it avoids the CLI and upload dependencies that
+live in ``string_guessing``.
+"""
+
+
+import itertools
+import json
+import mmap
+import operator
+import os
+import random
+import re
+import struct
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from math import ceil
+from math import log
+
+from cytoolz import curry
+from cytoolz import partition
+from cytoolz import sliding_window
+from cytoolz import take
+
+from solver import MeasurementIndex
+from solver import column_bitsets
+from solver import popcount
+from universe import Universe
+from universe import catalog_path
+from universe import open_snapshot
+from universe import snapshot_path
+
+#
+# Constants
+#
+
+
+ALPHABET = "ABCD"
+SEQUENCE_LENGTH = 5
+# Largest universe for which contracts are drawn from a precomputed catalog;
+# each catalog entry holds a bitset as wide as the universe
+CATALOG_MAX_UNIVERSE = 4096
+CATALOG_MAGIC = b"SGCTLG"
+CATALOG_VERSION = 1
+
+# magic, version, header length
+_CATALOG_PREAMBLE = struct.Struct("<6sII")
+# test, comparison, target, weight
+_CATALOG_ENTRY = struct.Struct("<HBHQ")
+# Largest universe games can be audited against when they are generated;
+# indexing a universe takes time and memory proportional to its size
+INDEX_MAX_UNIVERSE = 4096
+
+
+#
+# Generic helpers
+#
+
+
+def trace(*xs):
+    for x in xs:
+        print(x)
+    return xs
+
+
+# Counts of generation loop iterations and wall time spent in each stage,
+# accumulated for the whole process; see the ``profile`` command of
+# ``string_guessing``
+counters = Counter()
+stage_times = Counter()
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_times[name] += time.perf_counter() - start
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, ceil(len(ordered) * pct / 100))
+    return ordered[rank - 1]
+
+
+class DeadlineExceeded(Exception):
+    """Raised from generation loops once their deadline has passed."""
+
+
+def deadline_passed(deadline):
+    return deadline is not None and time.monotonic() > deadline
+
+
+def check_deadline(deadline):
+    if deadline_passed(deadline):
+        raise DeadlineExceeded()
+
+
+class GameDefinition:
+    def __init__(self, alphabet, length, num_samples, num_contracts, deadline=None):
+        self.alphabet = alphabet
+        self.length = length
+        self.num_samples = num_samples
+        self.num_contracts = num_contracts
+        # Absolute time.monotonic() after which generation settles for the
+        # best candidate found so far
+        self.deadline = deadline
+        self.quality = None
+
+    def make_sample(self):
+        return "".join(random.choice(self.alphabet) for _ in range(self.length)).upper()
+
+    def sample_generator(self):
+        while True:
+            yield self.make_sample()
+
+    def sample_set_generator(self):
+        return partition(self.num_samples, self.sample_generator())
+
+    def comparison_targets(self, callables):
+        # Set the aversion to zero compares and to compares between
+        # contracts.  These are totally empirical numbers, because after
+        # the contracts are generated here, the set of contracts are
+        # modified to better match the samples, and to meet other
+        # constraints.  Those constraints actually have a tendency to
+        # prefer zeros and contract compares, so we have to head it off by
+        # making those selections much less likely.
+        zero_avoidance = 10
+        var_avoidance = 15
+        # Prefer nonzero constants
+        val_rates = list(range(1, self.length))*zero_avoidance + [0]
+        constant_callables = [constant(i) for i in val_rates]
+        # Prefer comparison against constants, but have some comparisons
+        # against other contracts
+        return constant_callables*var_avoidance + callables
+
+    def make_contract(self):
+        catalog = load_catalog(self.alphabet, self.length)
+        if catalog is not None:
+            if random.random() < 0.7:
+                return catalog.draw()
+            return catalog.draw_and(self.deadline)
+
+        callables = self.contract_callables()
+        targets = self.comparison_targets(callables)
+
+        def cmp_against_gen():
+            return random.choice(targets)
+
+        if random.random() < 0.7:
+            return random_comparison(*callables)(cmp_against_gen())
+
+        else:
+            comparisons = (
+                random_comparison(*callables)(cmp_against_gen())
+                for _ in itertools.count()
+            )
+
+            first_comparison = next(comparisons)
+            second_comparison = next(
+                c
+                for c in comparisons
+                if deadline_passed(self.deadline)
+                or self.contract_similarity(c, first_comparison) < 0.7
+            )
+            if deadline_passed(self.deadline):
+                return first_comparison
+            return and_(first_comparison, second_comparison)
+
+    def contract_generator(self):
+        while True:
+            yield self.make_contract()
+
+    def contract_set_generator(self):
+        return partition(self.num_contracts, self.contract_generator())
+
+    def paired_contracts_samples(self):
+        start = time.monotonic()
+        best = {"candidate": None, "key": None}
+        rounds = 0
+
+        def _adjust_cs(cs):
+            (contracts, samples) = cs
+            with stage("fix_contracts"):
+                contracts_fixed = fix_contract_set(
+                    contracts, samples, self.make_contract, self.deadline,
+                )
+            with stage("fix_samples"):
+                samples_fixed = fix_sample_set(
+                    samples, contracts_fixed, self.make_sample, self.deadline,
+                )
+            return (contracts_fixed, samples_fixed)
+
+        def _track(contracts, samples, independence=None):
+            # Rank fully evaluated candidates first, then by how many
+            # constraints they still violate, then by how similar their most
+            # similar pair of contracts is.  A candidate whose similarities
+            # are unknown may violate any number of them, so its violations
+            # are reported as unknown too.
+            candidate = (contracts, samples)
+            violations = len(unacceptable_contracts(contracts, samples)) + len(
+                unacceptable_samples(samples, contracts)
+            )
+            if independence is None:
+                (max_similarity, rank) = (None, 1.0)
+            else:
+                violations += len([sim for (_, _, sim) in independence if sim > 0.7])
+                max_similarity = max((sim for (_, _, sim) in independence), default=0)
+                rank = max_similarity
+            evaluated = independence is not None
+            key = (not evaluated, violations, rank)
+            if (
+                best["candidate"] is None
+                or best["candidate"] == candidate
+                or key < best["key"]
+            ):
+                best.update(
+                    candidate=candidate,
+                    key=key,
+                    violations=violations if evaluated else None,
+                    max_similarity=max_similarity,
+                )
+
+        def _adjust_c(c, samples):
+            contracts = c[:]
+            n = len(contracts)
+            upper_triangle = flatten_list([
+                [(contracts[i], contracts[j]) for j in range(i+1, n)]
+                for i in range(n)
+            ])
+            if self.deadline is not None:
+                _track(c, samples)
+            independence = []
+            with stage("contract_independence"):
+                for (c1, c2) in upper_triangle:
+                    check_deadline(self.deadline)
+                    independence.append((c1, c2, self.contract_similarity(c1, c2)))
+            if self.deadline is not None:
+                _track(c, samples, independence)
+            not_good = flatten_list([
+                [c1, c2] for (c1, c2, sim) in independence if sim > 0.7
+            ])
+            offending = Counter(not_good)
+            to_remove = offending.most_common(1)
+            if to_remove:
+                counters["adjust_c_replacements"] += 1
+                contracts.remove(to_remove[0][0])
+                contracts.append(self.make_contract())
+            return contracts
+
+        def _adjust_both(cs):
+            nonlocal rounds
+            (new_contracts, new_samples) = _adjust_cs(cs)
+            newer_contracts = _adjust_c(new_contracts, new_samples)
+            rounds += 1
+            check_deadline(self.deadline)
+            return (newer_contracts, new_samples)
+
+        initial_contract_set = next(self.contract_set_generator())
+        initial_sample_set = next(self.sample_set_generator())
+        initial = (initial_contract_set, initial_sample_set)
+
+        try:
+            result = iterate_until_stable(_adjust_both, initial)
+            complete = True
+            violations = 0
+            max_similarity = best.get("max_similarity")
+        except DeadlineExceeded:
+            if best["candidate"] is None:
+                _track(*initial)
+            result = best["candidate"]
+            complete = False
+            violations = best["violations"]
+            max_similarity = best["max_similarity"]
+
+        self.quality = {
+            "complete": complete,
+            "rounds": rounds,
+            "violations": violations,
+            "max_similarity": max_similarity,
+            "elapsed": time.monotonic() - start,
+        }
+        return result
+
+    def available_callables(self):
+        alphabet = self.alphabet
+        length = self.length
+        sweep = sweep_offsets(max_=length - 1)
+
+        tri_positions = flatten_list(
+            [sweep([0, 1, 2]), sweep([0, 3, 4]), [[0, length // 2, -1]],]
+        )
+
+        return flatten_list(
+            [
+                [count_of(char) for char in alphabet],
+                [
+                    count_of_exact(f"{char1}{char2}")
+                    for char1 in alphabet
+                    for char2 in alphabet
+                ],
+                [
+                    at_positions(length, [i, j, k], char)
+                    for (i, j, k) in tri_positions
+                    for char in alphabet
+                ],
+            ]
+        )
+
+    def measurement_callables(self):
+        return self.available_callables()
+
+    def contract_callables(self):
+        alphabet = self.alphabet
+        length = self.length
+        sweep = sweep_offsets(max_=length - 1)
+
+        # We have a few extras in the contract callables
+        bi_positions = flatten_list([sweep([0, 1]), sweep([0, 2]), sweep([0, 3])])
+
+        tri_positions = flatten_list([sweep([0, 2, 3]), sweep([0, 2, 4])])
+
+        return flatten_list(
+            [
+                self.available_callables(),
+                [
+                    at_positions(length, [i, j, k], char)
+                    for (i, j, k) in tri_positions
+                    for char in alphabet
+                ],
+                [
+                    at_positions(length, [i, j], char)
+                    for (i, j) in bi_positions
+                    for char in alphabet
+                ],
+            ]
+        )
+
+    def random_measurements(self, available_pct=100):
+        callables = self.measurement_callables()
+        selected = []
+        for callable_ in callables:
+            if 100 * random.random() < available_pct:
+                selected.append(callable_)
+        return selected
+
+    def contract_similarity(self, contract1, contract2, num_samples=1000):
+        counters["contract_similarity"] += 1
+        # Fresh random samples are rarely seen again, so keep them out of the
+        # featurize cache
+        random_samples = map(Features, take(num_samples, self.sample_generator()))
+        counts = Counter(contract1(s) is contract2(s) for s in random_samples)
+        return counts.get(True, 0) / num_samples
+
+
+class GameAnalyzer:
+    def __init__(self, alphabet, length, num_samples, num_contracts):
+        self.alphabet = alphabet
+        self.length = length
+
+    def hist(self, *funcs):
+        universe = load_universe(self.alphabet, self.length)
+        columns = [universe.column(func) for func in funcs]
+        counts = Counter(zip(*columns))
+        return {k: v / universe.size for (k, v) in counts.items()}
+
+    def value(self, *funcs):
+        restriction = self.hist(*funcs).values()
+        log_geo_avg = sum(-log(r) for r in restriction) / len(restriction)
+        return round(10 * log_geo_avg)
+
+    def compare_values(self, *funcs):
+        vals_each = [self.value(func) for func in funcs]
+        vals_together = self.value(*funcs)
+        efficiency = vals_together / sum(vals_each)
+        return {
+            "each": vals_each,
+            "together": vals_together,
+            "efficiency": efficiency,
+        }
+
+
+@lru_cache(maxsize=None)
+def load_universe(alphabet, length):
+    """Map the universe snapshot for these parameters, or build one lazily."""
+    universe = open_snapshot(snapshot_path(alphabet, length))
+    if universe is None or (universe.alphabet, universe.length) != (alphabet, length):
+        universe = Universe(alphabet, length)
+    return universe
+
+
+@lru_cache(maxsize=16)
+def load_index(alphabet, length):
+    """Index the measurements of these parameters over their universe."""
+    setup = GameDefinition(alphabet, length, 0, 0)
+    return MeasurementIndex(
+        load_universe(alphabet, length), setup.measurement_callables(),
+    )
+
+
+@lru_cache(maxsize=16)
+def load_catalog(alphabet, length):
+    """Map the prebuilt contract catalog for these parameters, if there is one.
+
+    Catalogs are never built here, since this runs on request paths; see
+    ``write_catalog``.
+    """
+    return open_catalog(catalog_path(alphabet, length), alphabet, length)
+
+
+def universe_size(alphabet, length, limit):
+    """Size of the universe of these parameters, or None if above ``limit``."""
+    if len(alphabet) < 2:
+        return len(alphabet)
+    size = 1
+    for _ in range(length):
+        size *= len(alphabet)
+        if size > limit:
+            return None
+    return size
+
+
+def check_audit_bounds(alphabet, length, min_candidates, max_candidates):
+    """Raise ValueError unless these games can be audited to these bounds."""
+    if min_candidates is None and max_candidates is None:
+        return
+    # Samples are uppercased, so other letters would audit against the wrong
+    # universe, and repeated letters would count sequences more than once
+    if alphabet != "".join(dict.fromkeys(alphabet.upper())):
+        raise ValueError(
+            "Games can only be audited for alphabets of distinct uppercase "
+            "letters"
+        )
+    size = universe_size(alphabet, length, INDEX_MAX_UNIVERSE)
+    if size is None:
+        raise ValueError(
+            f"Games can only be audited for up to {INDEX_MAX_UNIVERSE} "
+            "possible sequences"
+        )
+    low = 1 if min_candidates is None else min_candidates
+    high = size if max_candidates is None else max_candidates
+    if not 1 <= low <= high or low > size:
+        raise ValueError(
+            f"Candidate bounds must satisfy 1 <= min <= max and min <= {size}"
+        )
+
+
+def game_alphabet(game):
+    """The (uppercased) alphabet a stored game was generated over.
+
+    Games reveal the count of every letter, named after the letter itself,
+    in alphabet order.
+    """
+    measures = next(iter(game.get("measures", {}).values()), {})
+    return "".join(text for text in measures if len(text) == 1)
+
+
+def audit_game(game, alphabet, length, deadline=None):
+    """Count the sequences consistent with each sample's revealed measures.
+
+    Measurements not indexed yet are only indexed while the ``deadline`` has
+    not passed; past it, DeadlineExceeded is raised instead.
+    """
+    index = load_index(alphabet, length)
+    for measures in game["measures"].values():
+        for text in measures:
+            if not index.has_bitsets(text):
+                check_deadline(deadline)
+                index.bitsets(text)
+    return {
+        sample_name: index.count(measures)
+        for (sample_name, measures) in game["measures"].items()
+    }
+
+
+def rx(s):
+    return re.compile(s)
+
+
+def flatten_list(seq):
+    return list(itertools.chain.from_iterable(seq))
+
+
+def replace_unacceptable(unacceptable, lst, element_maker, deadline=None):
+    while any(unacceptable(element) for element in lst):
+        counters["replace_unacceptable"] += 1
+        check_deadline(deadline)
+        lst = [
+            element_maker(element) if unacceptable(element) else element
+            for element in lst
+        ]
+    return lst
+
+
+def sample_unacceptable(sample, contract_set):
+    features = featurize(sample)
+    return any(
+        [
+            all(c(features) is True for c in contract_set),
+            not any(c(features) is True for c in contract_set),
+        ]
+    )
+
+
+def contract_unacceptable(contract, sample_set):
+    sample_set = [featurize(s) for s in sample_set]
+    return any(
+        [
+            all(contract(s) is True for s in sample_set),
+            not any(contract(s) is True for s in sample_set),
+        ]
+    )
+
+
+def unacceptable_samples(sample_set, contract_set):
+    return [s for s in sample_set if sample_unacceptable(s, contract_set)]
+
+
+def unacceptable_contracts(contract_set, sample_set):
+    return [c for c in contract_set if contract_unacceptable(c, sample_set)]
+
+
+def fix_sample_set(sample_set, contract_set, sample_maker, deadline=None):
+    def unacceptable(sample):
+        return sample_unacceptable(sample, contract_set)
+
+    return replace_unacceptable(
+        unacceptable, sample_set, lambda x: sample_maker(), deadline,
+    )
+
+
+def fix_contract_set(contract_set, sample_set, contract_maker, deadline=None):
+    sample_set = [featurize(s) for s in sample_set]
+
+    def unacceptable(contract):
+        return contract_unacceptable(contract, sample_set)
+
+    return replace_unacceptable(
+        unacceptable, contract_set, lambda x: contract_maker(), deadline,
+    )
+
+
+def fix_contracts_samples(contract_set, sample_set, contract_maker, sample_maker):
+    def _adjust(cs):
+        (contracts, samples) = cs
+        contracts_fixed = fix_contract_set(contracts, samples, contract_maker)
+        samples_fixed = fix_sample_set(samples, contracts_fixed, sample_maker)
+        return (contracts_fixed, samples_fixed)
+
+    return iterate_until_stable(_adjust, (contract_set, sample_set))
+
+
+@curry
+def greater_than(f, g):
+    def _greater_than(seq):
+        return f(seq) >= g(seq)
+
+    _greater_than._text = f"{f._text}≥{g._text}"
+    return _greater_than
+
+
+@curry
+def less_than(f, g):
+    def _less_than(seq):
+        return f(seq) <= g(seq)
+
+    _less_than._text = f"{f._text}≤{g._text}"
+    return _less_than
+
+
+@curry
+def equal_to(f, g):
+    def _equal_to(seq):
+        return f(seq) == g(seq)
+
+    _equal_to._text = f"{f._text}={g._text}"
+    return _equal_to
+
+
+COMPARISONS = [less_than, greater_than, equal_to]
+
+
+def random_comparison(*tests):
+    test = random.choice(tests)
+    compare = random.choice(COMPARISONS)
+    return compare(test)
+
+
+def iterate_until_stable(func, initial):
+    class _Uninitialized:
+        pass
+
+    oldvalue = _Uninitialized
+    value = initial
+
+    while value != oldvalue:
+        counters["iterate_until_stable"] += 1
+        oldvalue = value
+        value = func(value)
+
+    return value
+
+
+#
+# Predicate helpers
+#
+
+
+def and_(f1, f2):
+    def _and_(seq):
+        return f1(seq) and f2(seq)
+
+    _and_._text = f"{f1._text} and {f2._text}"
+    return _and_
+
+
+#
+# Featurization
+#
+
+
+class Features:
+    """Everything the measurements read from a sequence, from one scan.
+
+    ``counts`` holds the per-character counts (case-insensitive), ``bigrams``
+    the overlapping bigram counts (case-sensitive, like ``count_of_exact``)
+    and ``chars`` the uppercased character at each position.
+    """
+
+    __slots__ = ("text", "counts", "bigrams", "chars")
+
+    def __init__(self, seq):
+        counts = Counter()
+        bigrams = Counter()
+        chars = []
+        previous = None
+        for char in seq:
+            upper = char.upper()
+            counts[upper] += 1
+            chars.append(upper)
+            if previous is not None:
+                bigrams[previous + char] += 1
+            previous = char
+        self.text = seq
+        self.counts = counts
+        self.bigrams = bigrams
+        self.chars = "".join(chars)
+
+
+# Enough for the sequences of every universe small enough to be indexed
+@lru_cache(maxsize=2 * INDEX_MAX_UNIVERSE)
+def _featurize(seq):
+    return Features(seq)
+
+
+def featurize(seq):
+    """Return the (cached) feature vector of a sequence."""
+    if isinstance(seq, Features):
+        return seq
+    return _featurize(seq)
+
+
+#
+# Measurement helpers
+#
+
+
+def count_of(sub):
+    upper = sub.upper()
+
+    def _count_of(seq):
+        features = featurize(seq)
+        if len(upper) == 1:
+            return features.counts[upper]
+        return len(re.findall(upper, features.chars))
+
+    _count_of._text = f"{sub.upper()}"
+    return _count_of
+
+
+def count_of_exact(sub):
+    def _count_of_exact(seq):
+        features = featurize(seq)
+        if len(sub) == 2:
+            return features.bigrams[sub]
+        subs = ["".join(entry) for entry in sliding_window(len(sub), features.text)]
+        return subs.count(sub)
+
+    _count_of_exact._text = f"{sub.upper()}"
+    return _count_of_exact
+
+
+@curry
+def at_positions(length, positions, char):
+    upper = char.upper()
+
+    def _at_positions(seq):
+        chars = featurize(seq).chars
+        return len([i for i in positions if chars[i] == upper])
+
+    pos_description = ["."] * length
+    for pos in positions:
+        pos_description[pos] = char
+    _at_positions._text = "".join(pos_description)
+    return _at_positions
+
+
+@curry
+def sweep_offsets(kernel, max_):
+    def _componentwise(f, a, b):
+        return [f(*ab) for ab in zip(a, b)]
+
+    klen = len(kernel)
+    gen = (
+        _componentwise(lambda x, y: x + y, kernel, [i] * klen)
+        for i in itertools.count()
+    )
+    return list(itertools.takewhile(lambda x: x[-1] <= max_, gen))
+
+
+def constant(value):
+    def _constant(seq):
+        return value
+    _constant._text = f"{value}"
+    _constant._value = value
+    return _constant
+
+
+#
+# Contract catalog
+#
+
+
+class ContractCatalog:
+    """Every distinct comparison contract, canonicalized by truth table.
+
+    The catalog is built once per (alphabet, length) by ``write_catalog`` and
+    mapped read-only from the file, so processes share its pages.  Each entry
+    names a comparison and carries the total probability ``make_contract``
+    would give to all the comparisons sharing its truth table; tautologies and
+    contradictions are left out.  Contracts are rebuilt on each draw and carry
+    their truth table over the universe as ``_truth``, a bitset like those of
+    ``solver``.
+    """
+
+    def __init__(self, size, tests, targets, entries, truths):
+        self.size = size
+        self.everything = (1 << size) - 1
+        self.tests = tests
+        self.targets = targets
+        self.entries = entries
+        self.truths = truths
+        self.width = len(truths) // len(entries) if entries else 0
+        self.cum_weights = list(itertools.accumulate(
+            weight for (_, _, _, weight) in entries
+        ))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def contract(self, i):
+        (test, compare, target, _) = self.entries[i]
+        contract = COMPARISONS[compare](self.tests[test])(self.targets[target])
+        truth = self.truths[i * self.width:(i + 1) * self.width]
+        contract._truth = int.from_bytes(truth, "little")
+        return contract
+
+    def draw(self):
+        (i,) = random.choices(range(len(self)), cum_weights=self.cum_weights)
+        return self.contract(i)
+
+    def similarity(self, contract1, contract2):
+        """Fraction of the universe on which two contracts agree."""
+        agree = ~(contract1._truth ^ contract2._truth) & self.everything
+        return popcount(agree) / self.size
+
+    def draw_and(self, deadline=None, max_attempts=1000):
+        """Draw a conjunction of two dissimilar, compatible contracts."""
+        first = self.draw()
+        for _ in range(max_attempts):
+            if deadline_passed(deadline):
+                break
+            second = self.draw()
+            truth = first._truth & second._truth
+            if truth and self.similarity(first, second) < 0.7:
+                combined = and_(first, second)
+                combined._truth = truth
+                return combined
+        return first
+
+
+def build_catalog(setup, universe):
+    """Enumerate the comparisons ``setup`` can make and deduplicate them.
+
+    Returns ``{truth table: (total weight, (test, comparison, target key))}``,
+    where the comparison is the representative with the largest weight.
+    """
+    callables = setup.contract_callables()
+    targets = setup.comparison_targets(callables)
+    everything = (1 << universe.size) - 1
+
+    def _key(func):
+        return func._value if hasattr(func, "_value") else func._text
+
+    def _bitsets(func):
+        if hasattr(func, "_value"):
+            return {func._value: everything}
+        return column_bitsets(universe.column(func), universe.size)
+
+    tests = {c._text: c for c in callables}
+    test_weights = Counter(c._text for c in callables)
+    test_bitsets = {text: _bitsets(c) for (text, c) in tests.items()}
+    target_objs = {_key(g): g for g in targets}
+    target_weights = Counter(_key(g) for g in targets)
+    target_bitsets = {key: _bitsets(g) for (key, g) in target_objs.items()}
+
+    # truth table -> [total weight, weight of representative, representative]
+    canonical = {}
+    for (text, test_weight) in test_weights.items():
+        for compare in COMPARISONS:
+            for (key, target_weight) in target_weights.items():
+                truth = _compare_bitsets(
+                    compare, test_bitsets[text], target_bitsets[key],
+                )
+                if truth in (0, everything):
+                    continue
+                weight = test_weight * target_weight
+                entry = canonical.setdefault(truth, [0, 0, None])
+                entry[0] += weight
+                if weight > entry[1]:
+                    entry[1:] = [weight, (text, compare, key)]
+
+    return {
+        truth: (total, representative)
+        for (truth, (total, _, representative)) in canonical.items()
+    }
+
+
+def catalog_fits(alphabet, length):
+    """Whether a contract catalog can be built for these parameters."""
+    # Samples are uppercased, so a mixed-case universe would not match them
+    return (
+        alphabet == alphabet.upper()
+        and universe_size(alphabet, length, CATALOG_MAX_UNIVERSE) is not None
+    )
+
+
+def write_catalog(path, universe):
+    """Build the contract catalog of ``universe`` and write it to ``path``.
+
+    The file holds a JSON header naming the tests and targets, a table of
+    (test, comparison, target, weight) entries, then the truth table of each
+    entry as a little-endian bitmap of the universe.
+    """
+    (alphabet, length) = (universe.alphabet, universe.length)
+    if not catalog_fits(alphabet, length):
+        raise ValueError(
+            f"Catalogs only support uppercase alphabets and up to "
+            f"{CATALOG_MAX_UNIVERSE} sequences"
+        )
+
+    setup = GameDefinition(alphabet, length, 0, 0)
+    canonical = build_catalog(setup, universe)
+    tests = sorted({text for (_, (text, _, _)) in canonical.values()})
+    targets = sorted(
+        {key for (_, (_, _, key)) in canonical.values()},
+        key=lambda key: (isinstance(key, str), key),
+    )
+    if max(len(tests), len(targets)) > 0xFFFF:
+        raise ValueError("Too many tests or targets for a catalog")
+    test_ids = {text: i for (i, text) in enumerate(tests)}
+    target_ids = {key: i for (i, key) in enumerate(targets)}
+
+    header = json.dumps({
+        "alphabet": alphabet,
+        "length": length,
+        "size": universe.size,
+        "count": len(canonical),
+        "tests": tests,
+        "targets": targets,
+    }).encode("utf-8")
+    width = (universe.size + 7) // 8
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(_CATALOG_PREAMBLE.pack(CATALOG_MAGIC, CATALOG_VERSION, len(header)))
+        f.write(header)
+        for (total, (text, compare, key)) in canonical.values():
+            f.write(_CATALOG_ENTRY.pack(
+                test_ids[text], COMPARISONS.index(compare), target_ids[key], total,
+            ))
+        for truth in canonical:
+            f.write(truth.to_bytes(width, "little"))
+    os.replace(tmp_path, path)
+    return path
+
+
+def open_catalog(path, alphabet, length):
+    """Map a catalog read-only, or return None if it is missing or stale."""
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    if len(mapped) < _CATALOG_PREAMBLE.size:
+        return None
+    (magic, version, header_len) = _CATALOG_PREAMBLE.unpack_from(mapped)
+    if magic != CATALOG_MAGIC or version != CATALOG_VERSION:
+        return None
+
+    offset = _CATALOG_PREAMBLE.size
+    header = json.loads(bytes(mapped[offset:offset + header_len]))
+    offset += header_len
+    if (header["alphabet"], header["length"]) != (alphabet, length):
+        return None
+
+    view = memoryview(mapped)
+    count = header["count"]
+    entries_len = count * _CATALOG_ENTRY.size
+    entries = list(_CATALOG_ENTRY.iter_unpack(view[offset:offset + entries_len]))
+    offset += entries_len
+    truths = view[offset:]
+    if len(truths) != count * ((header["size"] + 7) // 8):
+        return None
+
+    # A catalog written by another version may name callables that are gone
+    setup = GameDefinition(alphabet, length, 0, 0)
+    callables = {c._text: c for c in setup.contract_callables()}
+    if any(text not in callables for text in header["tests"]) or any(
+        key not in callables
+        for key in header["targets"]
+        if not isinstance(key, int)
+    ):
+        return None
+    tests = [callables[text] for text in header["tests"]]
+    targets = [
+        constant(key) if isinstance(key, int) else callables[key]
+        for key in header["targets"]
+    ]
+
+    return ContractCatalog(header["size"], tests, targets, entries, truths)
+
+
+def _compare_bitsets(compare, f_bitsets, g_bitsets):
+    """Truth table of ``compare(f)(g)`` from the value bitsets of f and g."""
+    if compare is equal_to:
+        matches = operator.eq
+    elif compare is less_than:
+        matches = operator.le
+    else:
+        matches = operator.ge
+
+    truth = 0
+    for (v, f_bits) in f_bitsets.items():
+        for (w, g_bits) in g_bitsets.items():
+            if matches(v, w):
+                truth |= f_bits & g_bits
+    return truth
+
+
+#
+# Interactive stuff
+#
+
+
+def game_json(
+    alphabet, length, num_samples, num_contracts, deadline=None,
+    min_candidates=None, max_candidates=None, max_attempts=10,
+):
+    """Generate a game.
+
+    With a ``deadline`` (an absolute ``time.monotonic()`` value), generation
+    stops once it passes and the best candidate so far is used; the game then
+    carries a ``quality`` report saying how far from stable it was.
+
+    With ``min_candidates``/``max_candidates``, games where the measures of
+    some sample leave fewer or more consistent sequences are regenerated, up
+    to ``max_attempts`` times; the game then carries its ``candidates`` and
+    whether it was ``accepted``, which is False if no attempt met the bounds
+    and None if the deadline passed before the game could be audited.
+    Bounds that no game could meet raise ValueError (see
+    ``check_audit_bounds``).
+    """
+    check_audit_bounds(alphabet, length, min_candidates, max_candidates)
+    audit = min_candidates is not None or max_candidates is not None
+    low = 1 if min_candidates is None else min_candidates
+    high = float("inf") if max_candidates is None else max_candidates
+
+    for attempt in itertools.count(1):
+        game = _game_json(alphabet, length, num_samples, num_contracts, deadline)
+        if not audit:
+            return game
+
+        try:
+            with stage("audit"):
+                game["candidates"] = audit_game(game, alphabet, length, deadline)
+        except DeadlineExceeded:
+            game.update(candidates=None, accepted=None)
+            return game
+        game["accepted"] = all(
+            low <= n <= high for n in game["candidates"].values()
+        )
+        done = attempt >= max_attempts or deadline_passed(deadline)
+        if game["accepted"] or done:
+            return game
+
+
+def _game_json(alphabet, length, num_samples, num_contracts, deadline):
+    setup = GameDefinition(
+        alphabet, length, num_samples, num_contracts, deadline=deadline,
+    )
+    with stage("contracts_samples"):
+        (contract_set, sample_set) = setup.paired_contracts_samples()
+    with stage("measurements"):
+        measurement_set = setup.random_measurements()
+
+    with stage("evaluate"):
+        return _evaluate_game(setup, contract_set, sample_set, measurement_set)
+
+
+def _evaluate_game(setup, contract_set, sample_set, measurement_set):
+    sample_names = (f"sample{i}" for i in itertools.count(1))
+    named_samples = list(zip(sample_names, sample_set))
+
+    answers = {sample_name: sample for (sample_name, sample) in named_samples}
+    features = {
+        sample_name: featurize(sample) for (sample_name, sample) in named_samples
+    }
+
+    measurement_values = {
+        sample_name: {
+            measurement._text: measurement(features[sample_name])
+            for measurement in measurement_set
+        }
+        for (sample_name, _) in named_samples
+    }
+
+    contract_values = {
+        sample_name: {
+            contract._text: contract(features[sample_name])
+            for contract in contract_set
+        }
+        for (sample_name, _) in named_samples
+    }
+
+    game = {
+        "game": "0",
+        "answers": answers,
+        "measures": measurement_values,
+        "contracts": contract_values,
+    }
+    if setup.deadline is not None:
+        game["quality"] = setup.quality
+    return game
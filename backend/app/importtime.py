@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+
+
+"""Import-time budgets of the API modules.
+
+Workers import the API on every (re)start, so it should stay cheap, and it
+must not pull in the CLI or upload tooling.  This module has no third-party
+dependencies, so the budgets can be checked without the CLI installed.
+"""
+
+
+import json
+import os
+import subprocess
+import sys
+
+
+# Modules the API imports, and what importing each may cost in a fresh
+# interpreter, a few times what it measured (0.03s and 0.4s); modules that
+# must not be pulled in along the way
+IMPORT_BUDGETS = {"generation": 0.1, "main": 1.0}
+IMPORT_FORBIDDEN = ["click", "diceware", "string_guessing"]
+
+
+def import_time(module):
+    """Time importing ``module`` in a fresh interpreter.
+
+    Returns the seconds taken and which forbidden modules ended up loaded.
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"loaded = [m for m in {IMPORT_FORBIDDEN!r} if m in sys.modules]\n"
+        "print(json.dumps([elapsed, loaded]))\n"
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=here)
+    except subprocess.CalledProcessError:
+        return (float("inf"), [])
+    (elapsed, loaded) = json.loads(output)
+    return (elapsed, loaded)
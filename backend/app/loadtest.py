@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+
+"""Offline load generator for the backend API.
+
+Replays a mix of game creation, game fetches and score traffic, either
+against the app in-process or against a locally running uvicorn, and reports
+throughput and latency percentiles per route, error rates, and how much the
+data directory and score log grew during the run.
+"""
+
+
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from collections import defaultdict
+
+import click
+
+from generation import percentile
+
+
+#
+# Constants
+#
+
+
+# Relative weights of each route in the replayed traffic
+ROUTE_MIX = {
+    "POST /games/": 1,
+    "GET /games/{id}": 6,
+    "GET /scores/": 2,
+    "POST /scores/{id}": 2,
+}
+
+
+#
+# Clients
+#
+
+
+def in_process_client(data_dir):
+    """Return a request function calling the app directly, storing in data_dir."""
+    from fastapi.testclient import TestClient
+
+    import main as app_module
+
+    app_module.ROOT_PATH = data_dir
+    # Server errors should be counted as 500s, not kill the worker thread
+    client = TestClient(app_module.app, raise_server_exceptions=False)
+
+    def _request(method, path, body=None):
+        response = client.request(method, path, json=body)
+        return (response.status_code, response.content)
+
+    return _request
+
+
+def http_client(base_url):
+    """Return a request function talking to a running server over HTTP."""
+    base_url = base_url.rstrip("/")
+
+    def _request(method, path, body=None):
+        data = None if body is None else json.dumps(body).encode("utf-8")
+        request = urllib.request.Request(
+            f"{base_url}{path}",
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return (response.status, response.read())
+        except urllib.error.HTTPError as e:
+            return (e.code, e.read())
+
+    return _request
+
+
+#
+# Load generation
+#
+
+
+class LoadRun:
+    """Shared state of one load run: known game ids, latencies and errors."""
+
+    def __init__(self, request, game_body, route_mix=None):
+        self.request = request
+        self.game_body = game_body
+        self.route_mix = route_mix or ROUTE_MIX
+        self.game_ids = []
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def pick_route(self):
+        routes = list(self.route_mix)
+        weights = [self.route_mix[r] for r in routes]
+        route = random.choices(routes, weights)[0]
+        if route != "POST /games/" and not self.game_ids:
+            return "POST /games/"
+        return route
+
+    def hit(self, route):
+        if route == "POST /games/":
+            (method, path, body) = ("POST", "/games/", self.game_body)
+        elif route == "GET /games/{id}":
+            (method, path, body) = ("GET", f"/games/{self.random_id()}", None)
+        elif route == "GET /scores/":
+            (method, path, body) = ("GET", "/scores/", None)
+        else:
+            score = {"score": random.randint(0, 100)}
+            (method, path, body) = ("POST", f"/scores/{self.random_id()}", score)
+
+        start = time.perf_counter()
+        try:
+            (status, content) = self.request(method, path, body)
+            ok = status < 400
+        except Exception:
+            (status, content, ok) = (None, b"", False)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.latencies[route].append(elapsed)
+            if not ok:
+                self.errors[route] += 1
+            elif route == "POST /games/":
+                try:
+                    self.game_ids.append(json.loads(content)["id"])
+                except (ValueError, KeyError, TypeError):
+                    self.errors[route] += 1
+
+    def random_id(self):
+        with self._lock:
+            return random.choice(self.game_ids)
+
+    def run(self, concurrency, duration=None, num_requests=None):
+        deadline = None if duration is None else time.monotonic() + duration
+        remaining = [num_requests]
+
+        def _take():
+            with self._lock:
+                if remaining[0] is None:
+                    return True
+                if remaining[0] <= 0:
+                    return False
+                remaining[0] -= 1
+                return True
+
+        def _worker():
+            while _take() and (deadline is None or time.monotonic() < deadline):
+                self.hit(self.pick_route())
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=_worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+
+def dir_usage(path):
+    """Total size in bytes and number of files under path."""
+    size = 0
+    files = 0
+    for (root, _, names) in os.walk(path):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+                files += 1
+            except OSError:
+                pass
+    return (size, files)
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def report(run, elapsed):
+    """Summarize a finished run as a dict, one entry per route plus totals."""
+    routes = {}
+    for (route, latencies) in sorted(run.latencies.items()):
+        routes[route] = {
+            "requests": len(latencies),
+            "errors": run.errors[route],
+            "error_rate": run.errors[route] / len(latencies),
+            "throughput": len(latencies) / elapsed,
+            "p50_ms": 1000 * percentile(latencies, 50),
+            "p95_ms": 1000 * percentile(latencies, 95),
+            "p99_ms": 1000 * percentile(latencies, 99),
+        }
+    total = sum(len(v) for v in run.latencies.values())
+    return {
+        "elapsed_s": elapsed,
+        "requests": total,
+        "throughput": total / elapsed if elapsed else 0,
+        "routes": routes,
+    }
+
+
+#
+# Entry point
+#
+
+
+@click.command()
+@click.option("--url", default=None, help="Target a running server instead.")
+@click.option("--data-dir", default=None, help="Data directory to measure.")
+@click.option("--concurrency", default=8)
+@click.option("--duration", type=float, default=None)
+@click.option("--num-requests", type=int, default=500)
+@click.option("--alphabet", default="ABCD")
+@click.option("--length", type=int, default=5)
+@click.option("--num-samples", default=5)
+@click.option("--num-contracts", default=10)
+def main(
+    url, data_dir, concurrency, duration, num_requests,
+    alphabet, length, num_samples, num_contracts,
+):
+    if url is None:
+        if data_dir is None:
+            data_dir = tempfile.mkdtemp(prefix="loadtest-")
+        request = in_process_client(data_dir)
+    else:
+        request = http_client(url)
+
+    game_body = {
+        "alphabet": alphabet,
+        "length": length,
+        "samples": num_samples,
+        "contracts": num_contracts,
+    }
+    run = LoadRun(request, game_body)
+
+    if data_dir is not None:
+        score_log = os.path.join(data_dir, "games", "scores.log")
+        (size_before, files_before) = dir_usage(data_dir)
+        log_before = file_size(score_log)
+
+    if duration is not None:
+        num_requests = None
+    elapsed = run.run(concurrency, duration=duration, num_requests=num_requests)
+    result = report(run, elapsed)
+
+    if data_dir is not None:
+        (size_after, files_after) = dir_usage(data_dir)
+        result["data_dir"] = {
+            "path": data_dir,
+            "bytes_added": size_after - size_before,
+            "files_added": files_after - files_before,
+            "scores_log_bytes_added": file_size(score_log) - log_before,
+        }
+
+    click.echo(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
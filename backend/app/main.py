@@ -4,21 +4,71 @@
 """Main app entry point."""
 
 
+import asyncio
 import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from typing import Dict
+from typing import Optional
 from uuid import uuid1
 
 from fastapi import FastAPI
 from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from string_guessing import game_json
+import storage
+from generation import check_audit_bounds
+from generation import game_json
+from generation import load_catalog
+from generation import load_universe
 
 app = FastAPI()
 
 
 ROOT_PATH = "/data"
+MAX_BATCH_GAMES = 100
+# Game generation processes per API worker; there is already one API worker
+# per core, so keep this small
+GAME_PROCESSES = int(os.environ.get("GAME_PROCESSES", "2"))
+# Documents larger than this are streamed back as-is instead of parsed
+STREAM_DOCUMENT_BYTES = 1024 * 1024
+
+
+_game_executor = None
+
+
+def _get_game_executor():
+    """Lazily create the process pool used for game generation."""
+    global _game_executor
+    if _game_executor is None:
+        _game_executor = ProcessPoolExecutor(max_workers=GAME_PROCESSES)
+    return _game_executor
+
+
+#
+# Startup
+#
+
+
+@app.on_event("startup")
+def map_universe():
+    """Map the default universe snapshot and contract catalog, if prebuilt."""
+    defaults = GameDescription()
+    load_universe(defaults.alphabet, defaults.length)
+    load_catalog(defaults.alphabet, defaults.length)
+
+
+@app.on_event("startup")
+def ensure_root():
+    """Create the document root once, rather than checking it per request.
+
+    Writes create any missing directories themselves, so this only makes a
+    fresh store list as empty instead of missing.
+    """
+    storage.ensure_dir(ROOT_PATH)
 
 
 #
@@ -32,6 +82,18 @@ class GameDescription(BaseModel):
     length: int = 5
     samples: int = 5
     contracts: int = 10
+    # Latency budget in seconds; past it, the best game found so far is used
+    timeout: Optional[float] = None
+    # Acceptable number of hidden strings consistent with each sample's
+    # measures; the game says whether it was ``accepted``
+    min_candidates: Optional[int] = None
+    max_candidates: Optional[int] = None
+
+
+class GameBatchDescription(GameDescription):
+    """Request to create several games with the same parameters."""
+    count: int = 5
+    ids_only: bool = False
 
 
 class ScoreBody(BaseModel):
@@ -40,30 +102,126 @@ class ScoreBody(BaseModel):
 
 
 @app.post("/games/")
-def post_game(body: GameDescription):
+async def post_game(body: GameDescription):
     """Create a new game based on the provided parameters."""
+    _validate_game(body)
     id_ = str(uuid1())
 
-    game = game_json(
+    game = await _generate_game(body, _deadline(body))
+
+    await post_item(f"games/{id_}", game)
+
+    return {"id": id_}
+
+
+@app.post("/games/batch")
+async def post_game_batch(body: GameBatchDescription):
+    """Create several games, streaming each back as NDJSON once saved."""
+    if not 0 < body.count <= MAX_BATCH_GAMES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch size must be between 1 and {MAX_BATCH_GAMES}",
+        )
+    _validate_game(body)
+
+    return StreamingResponse(
+        _stream_game_batch(body, _deadline(body)),
+        media_type="application/x-ndjson",
+    )
+
+
+def _validate_game(body):
+    """Reject parameters generation cannot work with, before starting it."""
+    # Samples are uppercased; over a single letter they are all the same
+    if len(set(body.alphabet.upper())) < 2:
+        raise HTTPException(
+            status_code=400, detail="Alphabet needs at least two distinct letters",
+        )
+    if body.length < 1:
+        raise HTTPException(status_code=400, detail="Length must be positive")
+    # With fewer than two samples (or contracts) no contract (or sample) can
+    # be true for some and false for others, so generation would never settle
+    if body.samples < 2 or body.contracts < 2:
+        raise HTTPException(
+            status_code=400,
+            detail="Games need at least two samples and two contracts",
+        )
+    try:
+        check_audit_bounds(
+            body.alphabet, body.length, body.min_candidates, body.max_candidates,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _deadline(body):
+    """Absolute monotonic deadline for a game request, if it has a timeout."""
+    if body.timeout is None:
+        return None
+    return time.monotonic() + body.timeout
+
+
+def _generate_game(body, deadline=None):
+    """Run game generation, which is CPU-bound, in the process pool."""
+    generate = partial(
+        game_json,
         alphabet=body.alphabet,
         length=body.length,
         num_samples=body.samples,
         num_contracts=body.contracts,
+        deadline=deadline,
+        min_candidates=body.min_candidates,
+        max_candidates=body.max_candidates,
     )
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(_get_game_executor(), generate)
 
-    post_item(f"games/{id_}", game)
 
-    return {"id": id_}
+async def _stream_game_batch(body, deadline=None):
+    """Generate games concurrently, saving and yielding them as they finish.
+
+    The response has already started, so failures are reported as
+    ``{"error": ...}`` lines instead of raised.  Whatever is still pending
+    when the stream ends early (e.g. the client goes away) is cancelled.
+    """
+    pending = {_generate_game(body, deadline) for _ in range(body.count)}
+
+    try:
+        while pending:
+            (done, pending) = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED,
+            )
+            games = {}
+            for future in done:
+                try:
+                    games[str(uuid1())] = future.result()
+                except Exception as e:
+                    yield json.dumps({"error": f"Generation failed: {e!r}"}) + "\n"
+
+            try:
+                await post_items("games", games)
+            except Exception as e:
+                yield json.dumps({"error": f"Failed to save games: {e!r}"}) + "\n"
+                continue
+
+            for (id_, game) in games.items():
+                if body.ids_only:
+                    line = {"id": id_}
+                else:
+                    line = {"id": id_, "game": game}
+                yield json.dumps(line) + "\n"
+    finally:
+        for future in pending:
+            future.cancel()
 
 
 @app.get("/scores/")
-def get_scores():
+async def get_scores():
     """Retrieve the high scores."""
     abs_path = _correct_path("games/scores.log")
 
     try:
-        with open(abs_path, "r") as f:
-            lines = f.readlines()
+        lines = await storage.aread_lines(abs_path)
     except OSError:
         lines = []
 
@@ -79,14 +237,13 @@ def get_scores():
 
 
 @app.post("/scores/{id_}")
-def post_score(id_: str, body: ScoreBody):
+async def post_score(id_: str, body: ScoreBody):
     """Post a new score."""
     score = body.score
     abs_path = _correct_path("games/scores.log")
 
     try:
-        with open(abs_path, "a") as f:
-            f.write(f"{id_} {score}\n")
+        await storage.aappend_line(abs_path, f"{id_} {score}")
         return {id_: score}
     except OSError:
         raise HTTPException(
@@ -107,14 +264,6 @@ def _correct_path(path):
     if ".." in path:
         raise HTTPException(status_code=400, detail="Paths must be absolute")
 
-    if not os.path.isdir(ROOT_PATH):
-        try:
-            os.makedirs(ROOT_PATH, exist_ok=True)
-        except FileExistsError:
-            raise HTTPException(
-                status_code=500, detail="Bad document root",
-            )
-
     # If the path is entirely slashes, it is referring to root
     if path.count("/") == len(path):
         joined = ROOT_PATH
@@ -125,59 +274,96 @@ def _correct_path(path):
 
 
 @app.get("/")
-def get_root():
+async def get_root():
     """GET the root."""
-    return get_item("/")
+    return await get_item("/")
 
 
 @app.get("/{file_path:path}")
-def get_item(file_path: str):
+async def get_item(file_path: str):
     """GET an item."""
     abs_path = _correct_path(file_path)
+    (kind, size) = await storage.akind(abs_path)
 
-    if os.path.isdir(abs_path):
-        return {file_path: os.listdir(abs_path)}
+    if kind == "dir":
+        return StreamingResponse(
+            _stream_listing(file_path, abs_path),
+            media_type="application/json",
+        )
 
-    elif os.path.isfile(abs_path):
-        with open(abs_path, "r") as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
+    elif kind == "file":
+        # Large documents are only sniffed (in an I/O thread) rather than
+        # parsed into the response, then streamed as-is
+        if size > STREAM_DOCUMENT_BYTES:
+            if not await storage.alooks_like_json(abs_path):
                 raise HTTPException(
                     status_code=500,
                     detail="Path does not refer to a JSON document",
                 )
+            return StreamingResponse(
+                storage.aiter_chunks(abs_path),
+                media_type="application/json",
+            )
+
+        try:
+            return await storage.aread_json(abs_path)
+        except ValueError:
+            raise HTTPException(
+                status_code=500,
+                detail="Path does not refer to a JSON document",
+            )
 
     else:
         raise HTTPException(status_code=404, detail="Path not found")
 
 
+async def _stream_listing(file_path, abs_path):
+    """Stream ``{file_path: [names...]}`` without listing the directory at once."""
+    yield "{" + json.dumps(file_path) + ": ["
+    first = True
+    async for names in storage.aiter_dir(abs_path):
+        for name in names:
+            yield ("" if first else ", ") + json.dumps(name)
+            first = False
+    yield "]}"
+
+
 @app.post("/{file_path:path}")
-def post_item(file_path: str, body: Dict):
+async def post_item(file_path: str, body: Dict):
     """POST an item."""
     abs_path = _correct_path(file_path)
-    dirname = os.path.dirname(abs_path)
+    await _ensure_dir(os.path.dirname(abs_path))
+    await storage.awrite_json(abs_path, body)
 
-    if not os.path.isdir(dirname):
-        try:
-            os.makedirs(dirname, exist_ok=True)
-        except FileExistsError:
-            raise HTTPException(
-                status_code=500,
-                detail="Path refers to a directory which is invalid",
-            )
 
-    with open(abs_path, "w") as f:
-        json.dump(body, f)
+async def post_items(dir_path: str, bodies: Dict[str, Dict]):
+    """Write several items into one directory in a single batch."""
+    abs_dir = _correct_path(dir_path)
+    await _ensure_dir(abs_dir)
+
+    await asyncio.gather(*(
+        storage.awrite_json(os.path.join(abs_dir, name), body)
+        for (name, body) in bodies.items()
+    ))
+
+
+async def _ensure_dir(dirname):
+    """Create a directory for items if it does not exist yet."""
+    try:
+        await storage.aensure_dir(dirname)
+    except FileExistsError:
+        raise HTTPException(
+            status_code=500,
+            detail="Path refers to a directory which is invalid",
+        )
 
 
 @app.delete("/{file_path:path}")
-def delete_item(file_path: str):
+async def delete_item(file_path: str):
     """DELETE an item."""
     abs_path = _correct_path(file_path)
 
-    if os.path.exists(abs_path):
-        os.remove(abs_path)
-
-    else:
+    try:
+        await storage.aremove(abs_path)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Path not found")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+
+"""Inverted index from revealed measurements to consistent sequences.
+
+For every measurement and each of its values, the index holds a bitset (a
+Python int) of the sequences of the universe taking that value, with bit
+``i`` standing for ``universe.sequence(i)``.  The sequences consistent with a
+set of revealed measurements are then the intersection of their bitsets.
+"""
+
+
+from collections import defaultdict
+
+
+class MeasurementIndex:
+    """Maps (measurement ``_text``, value) to a bitset of matching sequences."""
+
+    def __init__(self, universe, callables):
+        self.universe = universe
+        self.callables = {c._text: c for c in callables}
+        self.everything = (1 << universe.size) - 1
+        self._bitsets = {}
+
+    def bitsets(self, text):
+        """All bitsets of one measurement, keyed by value; built on first use."""
+        if text not in self._bitsets:
+            if text not in self.callables:
+                raise KeyError(f"Measurement {text!r} is not indexed")
+            column = self.universe.column(self.callables[text])
+            self._bitsets[text] = column_bitsets(column, self.universe.size)
+        return self._bitsets[text]
+
+    def has_bitsets(self, text):
+        """Whether the bitsets of a measurement are already built."""
+        return text in self._bitsets
+
+    def bitset(self, text, value):
+        return self.bitsets(text).get(value, 0)
+
+    def candidates(self, measures):
+        """Bitset of the sequences consistent with ``{text: value}``."""
+        result = self.everything
+        for (text, value) in measures.items():
+            result &= self.bitset(text, value)
+            if not result:
+                break
+        return result
+
+    def count(self, measures):
+        return popcount(self.candidates(measures))
+
+
+def popcount(bitset):
+    return bin(bitset).count("1")
+
+
+def column_bitsets(column, size):
+    """Bitsets of the sequences taking each value of a universe column."""
+    maps = defaultdict(lambda: bytearray((size + 7) // 8))
+    for (i, value) in enumerate(column):
+        maps[value][i >> 3] |= 1 << (i & 7)
+    return {
+        value: int.from_bytes(bitmap, "little") for (value, bitmap) in maps.items()
+    }
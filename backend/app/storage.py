@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+
+
+"""Filesystem storage that is safe to share between worker processes.
+
+Documents are written to a temporary file in the target directory and then
+renamed over the destination, so readers never need a lock: they either see
+the old document or the new one, never a torn one.  Append-only logs use
+advisory ``flock`` locks, exclusive for writers and shared for readers.
+
+Each operation also has an ``a``-prefixed coroutine version for the API.  Those
+run the blocking call on a small dedicated thread pool, so that the event loop
+(and whoever is waiting on slow clients) never blocks on the disk.
+"""
+
+
+import asyncio
+import fcntl
+import json
+import os
+import stat
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+TEMP_PREFIX = ".tmp-"
+IO_THREADS = int(os.environ.get("STORAGE_IO_THREADS", "8"))
+CHUNK_SIZE = 64 * 1024
+
+
+def _read_umask():
+    # The umask can only be read by setting it, so do it once at import,
+    # before any I/O threads could create files in between
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+_UMASK = _read_umask()
+
+_io_executor = ThreadPoolExecutor(
+    max_workers=IO_THREADS, thread_name_prefix="storage-io",
+)
+
+
+#
+# Documents
+#
+
+
+def ensure_dir(dirname):
+    """Create a directory (and its parents) if it does not exist yet."""
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname, exist_ok=True)
+
+
+def read_json(abs_path):
+    """Read a JSON document; no lock is needed since writes are atomic."""
+    with open(abs_path, "r") as f:
+        return json.load(f)
+
+
+def write_json(abs_path, body):
+    """Atomically replace ``abs_path`` with the JSON encoding of ``body``."""
+    (fd, tmp_path) = tempfile.mkstemp(
+        prefix=TEMP_PREFIX, dir=os.path.dirname(abs_path),
+    )
+    try:
+        # mkstemp creates 0600 files; give documents the usual permissions
+        os.fchmod(fd, 0o666 & ~_UMASK)
+        with os.fdopen(fd, "w") as f:
+            json.dump(body, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, abs_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def looks_like_json(abs_path, sniff_size=1024):
+    """Whether a file starts like a JSON object or array, without parsing it.
+
+    Documents are only ever replaced whole by ``write_json``, so this is
+    enough to tell them from logs without reading large ones twice.
+    """
+    with open(abs_path, "rb") as f:
+        start = f.read(sniff_size).lstrip()
+    return start[:1] in (b"{", b"[")
+
+
+def kind(abs_path):
+    """Return ("dir", None), ("file", size) or (None, None) for a path."""
+    try:
+        st = os.stat(abs_path)
+    except FileNotFoundError:
+        return (None, None)
+    if stat.S_ISDIR(st.st_mode):
+        return ("dir", None)
+    if stat.S_ISREG(st.st_mode):
+        return ("file", st.st_size)
+    return (None, None)
+
+
+def remove(abs_path):
+    """Remove a document."""
+    os.remove(abs_path)
+
+
+#
+# Append-only logs
+#
+
+
+def append_line(abs_path, line):
+    """Append a line to a log while holding an exclusive lock."""
+    with open(abs_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            f.write(line.rstrip("\n") + "\n")
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_lines(abs_path):
+    """Read all complete lines of a log while holding a shared lock."""
+    with open(abs_path, "r") as f:
+        fcntl.flock(f, fcntl.LOCK_SH)
+        try:
+            return f.readlines()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+#
+# Coroutine versions
+#
+
+
+async def _run(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, partial(func, *args))
+
+
+async def aensure_dir(dirname):
+    return await _run(ensure_dir, dirname)
+
+
+async def aread_json(abs_path):
+    return await _run(read_json, abs_path)
+
+
+async def alooks_like_json(abs_path):
+    return await _run(looks_like_json, abs_path)
+
+
+async def awrite_json(abs_path, body):
+    return await _run(write_json, abs_path, body)
+
+
+async def akind(abs_path):
+    return await _run(kind, abs_path)
+
+
+async def aremove(abs_path):
+    return await _run(remove, abs_path)
+
+
+async def aappend_line(abs_path, line):
+    return await _run(append_line, abs_path, line)
+
+
+async def aread_lines(abs_path):
+    return await _run(read_lines, abs_path)
+
+
+def _next_names(entries, batch_size):
+    names = []
+    for entry in entries:
+        if not entry.name.startswith(TEMP_PREFIX):
+            names.append(entry.name)
+        if len(names) >= batch_size:
+            break
+    return names
+
+
+async def aiter_dir(abs_path, batch_size=256):
+    """Yield the names in a directory in batches, without listing it at once."""
+    entries = await _run(os.scandir, abs_path)
+    try:
+        while True:
+            names = await _run(_next_names, entries, batch_size)
+            if not names:
+                break
+            yield names
+    finally:
+        entries.close()
+
+
+async def aiter_chunks(abs_path, chunk_size=CHUNK_SIZE):
+    """Yield the raw contents of a file chunk by chunk."""
+    f = await _run(open, abs_path, "rb")
+    try:
+        while True:
+            chunk = await _run(f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        f.close()
+
+
+#
+# Harnesses
+#
+
+
+def _stress_writer(path, log_path, num_writes, payload_size):
+    for i in range(num_writes):
+        write_json(path, {"i": i, "payload": "x" * payload_size})
+        append_line(log_path, f"writer {i}")
+
+
+def _stress_reader(path, log_path, num_reads, errors):
+    torn = 0
+    for _ in range(num_reads):
+        try:
+            doc = read_json(path)
+            if set(doc) != {"i", "payload"}:
+                torn += 1
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError:
+            torn += 1
+        torn += sum(
+            1 for line in read_lines(log_path)
+            if not line.endswith("\n")
+        )
+    errors.put(torn)
+
+
+def stress(root, writers=4, readers=4, num_ops=500, payload_size=64 * 1024):
+    """Hammer one document and one log from many processes.
+
+    Returns the number of torn reads observed, which should be zero.
+    """
+    from multiprocessing import Process
+    from multiprocessing import Queue
+
+    ensure_dir(root)
+    path = os.path.join(root, "stress.json")
+    log_path = os.path.join(root, "stress.log")
+    open(log_path, "a").close()
+    errors = Queue()
+
+    procs = [
+        Process(target=_stress_writer, args=(path, log_path, num_ops, payload_size))
+        for _ in range(writers)
+    ] + [
+        Process(target=_stress_reader, args=(path, log_path, num_ops, errors))
+        for _ in range(readers)
+    ]
+    for proc in procs:
+        proc.start()
+    torn = sum(errors.get() for _ in range(readers))
+    for proc in procs:
+        proc.join()
+
+    log_lines = read_lines(log_path)
+    if len(log_lines) != writers * num_ops:
+        torn += abs(writers * num_ops - len(log_lines))
+    leftovers = [n for n in os.listdir(root) if n.startswith(TEMP_PREFIX)]
+    return torn + len(leftovers)
+
+
+#
+# Entry point
+#
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as root:
+        torn = stress(root)
+    print(f"torn reads: {torn}")
+    sys.exit(1 if torn else 0)
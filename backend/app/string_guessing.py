@@ -1,259 +1,48 @@
 #!/usr/bin/env python
 
 
-import itertools
+"""Command line harnesses around the generation core in ``generation``."""
+
+
+import cProfile
 import json
 import os
-import random
-import re
+import signal
 import subprocess
-import tempfile
+import sys
+import time
 from collections import Counter
-from collections import defaultdict
-from functools import reduce
-from math import isclose
-from math import log
-from math import sqrt
-from types import SimpleNamespace
+from contextlib import ExitStack
+from contextlib import contextmanager
 
 import click
-import diceware
-from cytoolz import curry
-from cytoolz import dissoc
-from cytoolz import juxt
-from cytoolz import partition
-from cytoolz import sliding_window
-from cytoolz import take
-
-#
-# Constants
-#
-
-
-ALPHABET = "ABCD"
-SEQUENCE_LENGTH = 5
 
+from corpus import analyze_corpus
+from generation import GameDefinition
+from generation import audit_game
+from generation import catalog_fits
+from generation import counters
+from generation import game_alphabet
+from generation import game_json
+from generation import percentile
+from generation import stage_times
+from generation import write_catalog
+from importtime import IMPORT_BUDGETS
+from importtime import import_time
+from universe import catalog_path
+from universe import open_snapshot
+from universe import snapshot_path
+from universe import write_snapshot
 
 #
-# Generic helpers
+# Helpers
 #
 
 
-def trace(*xs):
-    for x in xs:
-        print(x)
-    return xs
-
-
-class GameDefinition:
-    def __init__(self, alphabet, length, num_samples, num_contracts):
-        self.alphabet = alphabet
-        self.length = length
-        self.num_samples = num_samples
-        self.num_contracts = num_contracts
-
-    def make_sample(self):
-        return "".join(random.choice(self.alphabet) for _ in range(self.length)).upper()
-
-    def sample_generator(self):
-        while True:
-            yield self.make_sample()
-
-    def sample_set_generator(self):
-        return partition(self.num_samples, self.sample_generator())
-
-    def make_contract(self):
-        callables = self.contract_callables()
-
-        def cmp_against_gen():
-            # Set the aversion to zero compares and to compares between
-            # contracts.  These are totally empirical numbers, because after
-            # the contracts are generated here, the set of contracts are
-            # modified to better match the samples, and to meet other
-            # constraints.  Those constraints actually have a tendency to
-            # prefer zeros and contract compares, so we have to head it off by
-            # making those selections much less likely.
-            zero_avoidance = 10
-            var_avoidance = 15
-            # Prefer nonzero constants
-            val_rates = list(range(1, self.length))*zero_avoidance + [0]
-            constant_callables = [constant(i) for i in val_rates]
-            # Prefer comparison against constants, but have some comparisons
-            # against other contracts
-            return random.choice(constant_callables*var_avoidance + callables)
-
-        if random.random() < 0.7:
-            return random_comparison(*callables)(cmp_against_gen())
-
-        else:
-            comparisons = (
-                random_comparison(*callables)(cmp_against_gen())
-                for _ in itertools.count()
-            )
-
-            first_comparison = next(comparisons)
-            second_comparison = next(
-                c
-                for c in comparisons
-                if self.contract_similarity(c, first_comparison) < 0.7
-            )
-            return and_(first_comparison, second_comparison)
-
-    def contract_generator(self):
-        while True:
-            yield self.make_contract()
-
-    def contract_set_generator(self):
-        return partition(self.num_contracts, self.contract_generator())
-
-    def paired_contracts_samples(self):
-        def _adjust_cs(cs):
-            (contracts, samples) = cs
-            contracts_fixed = fix_contract_set(contracts, samples, self.make_contract,)
-            samples_fixed = fix_sample_set(samples, contracts_fixed, self.make_sample,)
-            return (contracts_fixed, samples_fixed)
-
-        def _adjust_c(c):
-            contracts = c[:]
-            n = len(contracts)
-            upper_triangle = flatten_list([
-                [(contracts[i], contracts[j]) for j in range(i+1, n)]
-                for i in range(n)
-            ])
-            independence = [
-                (c1, c2, self.contract_similarity(c1, c2))
-                for (c1, c2) in upper_triangle
-            ]
-            not_good = flatten_list([
-                [c1, c2] for (c1, c2, sim) in independence if sim > 0.7
-            ])
-            offending = Counter(not_good)
-            to_remove = offending.most_common(1)
-            if to_remove:
-                contracts.remove(to_remove[0][0])
-                contracts.append(self.make_contract())
-            return contracts
-
-        def _adjust_both(cs):
-            (new_contracts, new_samples) = _adjust_cs(cs)
-            newer_contracts = _adjust_c(new_contracts)
-            return (newer_contracts, new_samples)
-
-        initial_contract_set = next(self.contract_set_generator())
-        initial_sample_set = next(self.sample_set_generator())
-
-        return iterate_until_stable(
-            _adjust_both,
-            (initial_contract_set, initial_sample_set),
-        )
-
-    def available_callables(self):
-        alphabet = self.alphabet
-        length = self.length
-        sweep = sweep_offsets(max_=length - 1)
-
-        tri_positions = flatten_list(
-            [sweep([0, 1, 2]), sweep([0, 3, 4]), [[0, length // 2, -1]],]
-        )
-
-        return flatten_list(
-            [
-                [count_of(char) for char in alphabet],
-                [
-                    count_of_exact(f"{char1}{char2}")
-                    for char1 in alphabet
-                    for char2 in alphabet
-                ],
-                [
-                    at_positions(length, [i, j, k], char)
-                    for (i, j, k) in tri_positions
-                    for char in alphabet
-                ],
-            ]
-        )
-
-    def measurement_callables(self):
-        return self.available_callables()
-
-    def contract_callables(self):
-        alphabet = self.alphabet
-        length = self.length
-        sweep = sweep_offsets(max_=length - 1)
-
-        # We have a few extras in the contract callables
-        bi_positions = flatten_list([sweep([0, 1]), sweep([0, 2]), sweep([0, 3])])
-
-        tri_positions = flatten_list([sweep([0, 2, 3]), sweep([0, 2, 4])])
-
-        return flatten_list(
-            [
-                self.available_callables(),
-                [
-                    at_positions(length, [i, j, k], char)
-                    for (i, j, k) in tri_positions
-                    for char in alphabet
-                ],
-                [
-                    at_positions(length, [i, j], char)
-                    for (i, j) in bi_positions
-                    for char in alphabet
-                ],
-            ]
-        )
-
-    def random_measurements(self, available_pct=100):
-        callables = self.measurement_callables()
-        selected = []
-        for callable_ in callables:
-            if 100 * random.random() < available_pct:
-                selected.append(callable_)
-        return selected
-
-    def contract_similarity(self, contract1, contract2, num_samples=1000):
-        random_samples = take(num_samples, self.sample_generator())
-        counts = Counter(contract1(s) is contract2(s) for s in random_samples)
-        return counts.get(True, 0) / num_samples
-
-
-class GameAnalyzer:
-    def __init__(self, alphabet, length, num_samples, num_contracts):
-        self.alphabet = alphabet
-        self.length = length
-
-    def hist(self, *funcs):
-        alphabet = self.alphabet
-        length = self.length
-        seqs = ("".join(p) for p in itertools.product(*[alphabet] * length))
-        num = len(alphabet) ** length
-        f = juxt(*funcs)
-        counts = Counter(f(seq) for seq in seqs)
-        return {k: v / num for (k, v) in counts.items()}
-
-    def value(self, *funcs):
-        restriction = self.hist(*funcs).values()
-        log_geo_avg = sum(-log(r) for r in restriction) / len(restriction)
-        return round(10 * log_geo_avg)
-
-    def compare_values(self, *funcs):
-        vals_each = [self.value(func) for func in funcs]
-        vals_together = self.value(*funcs)
-        efficiency = vals_together / sum(vals_each)
-        return {
-            "each": vals_each,
-            "together": vals_together,
-            "efficiency": efficiency,
-        }
-
-
-def rx(s):
-    return re.compile(s)
-
-
-def flatten_list(seq):
-    return list(itertools.chain.from_iterable(seq))
-
-
 def random_word():
+    # Only uploads need diceware, so keep it off the import path of the CLI
+    import diceware
+
     return (
         subprocess.check_output(
             f"sort -R {diceware.get_wordlist_path('en')} | head -n1", shell=True,
@@ -267,206 +56,79 @@ def random_words(num):
     return "-".join(random_word() for _ in range(num))
 
 
-def replace_unacceptable(unacceptable, lst, element_maker):
-    while any(unacceptable(element) for element in lst):
-        lst = [
-            element_maker(element) if unacceptable(element) else element
-            for element in lst
-        ]
-    return lst
-
-
-def fix_sample_set(sample_set, contract_set, sample_maker):
-    def unacceptable(sample):
-        return any(
-            [
-                all(c(sample) is True for c in contract_set),
-                not any(c(sample) is True for c in contract_set),
-            ]
-        )
-
-    return replace_unacceptable(unacceptable, sample_set, lambda x: sample_maker(),)
-
-
-def fix_contract_set(contract_set, sample_set, contract_maker):
-    def unacceptable(contract):
-        return any(
-            [
-                all(contract(s) is True for s in sample_set),
-                not any(contract(s) is True for s in sample_set),
-            ]
-        )
-
-    return replace_unacceptable(unacceptable, contract_set, lambda x: contract_maker(),)
-
-
-def fix_contracts_samples(contract_set, sample_set, contract_maker, sample_maker):
-    def _adjust(cs):
-        (contracts, samples) = cs
-        contracts_fixed = fix_contract_set(contracts, samples, contract_maker)
-        samples_fixed = fix_sample_set(samples, contracts_fixed, sample_maker)
-        return (contracts_fixed, samples_fixed)
-
-    return iterate_until_stable(_adjust, (contract_set, sample_set))
-
-
-def random_comparison(*tests):
-    @curry
-    def greater_than(f, g):
-        def _greater_than(seq):
-            return f(seq) >= g(seq)
-
-        _greater_than._text = f"{f._text}≥{g._text}"
-        return _greater_than
-
-    @curry
-    def less_than(f, g):
-        def _less_than(seq):
-            return f(seq) <= g(seq)
-
-        _less_than._text = f"{f._text}≤{g._text}"
-        return _less_than
-
-    @curry
-    def equal_to(f, g):
-        def _equal_to(seq):
-            return f(seq) == g(seq)
-
-        _equal_to._text = f"{f._text}={g._text}"
-        return _equal_to
-
-    test = random.choice(tests)
-    compare = random.choice([less_than, greater_than, equal_to])
-    return compare(test)
-
-
-def iterate_until_stable(func, initial):
-    class _Uninitialized:
-        pass
-
-    oldvalue = _Uninitialized
-    value = initial
-
-    while value != oldvalue:
-        oldvalue = value
-        value = func(value)
-
-    return value
-
-
 #
-# Predicate helpers
-#
-
-
-def and_(f1, f2):
-    def _and_(seq):
-        return f1(seq) and f2(seq)
-
-    _and_._text = f"{f1._text} and {f2._text}"
-    return _and_
-
-
-#
-# Measurement helpers
-#
-
-
-def count_of(sub):
-    def _count_of(seq):
-        return len(re.findall(sub.upper(), seq.upper()))
-
-    _count_of._text = f"{sub.upper()}"
-    return _count_of
-
-
-def count_of_exact(sub):
-    def _count_of_exact(seq):
-        subs = ["".join(entry) for entry in sliding_window(len(sub), seq)]
-        return subs.count(sub)
-
-    _count_of_exact._text = f"{sub.upper()}"
-    return _count_of_exact
-
-
-@curry
-def at_positions(length, positions, char):
-    def _at_positions(seq):
-        return len([seq[i] for i in positions if seq[i].upper() == char.upper()])
-
-    pos_description = ["."] * length
-    for pos in positions:
-        pos_description[pos] = char
-    _at_positions._text = "".join(pos_description)
-    return _at_positions
-
-
-@curry
-def sweep_offsets(kernel, max_):
-    def _componentwise(f, a, b):
-        return [f(*ab) for ab in zip(a, b)]
-
-    klen = len(kernel)
-    gen = (
-        _componentwise(lambda x, y: x + y, kernel, [i] * klen)
-        for i in itertools.count()
-    )
-    return list(itertools.takewhile(lambda x: x[-1] <= max_, gen))
-
-
-def constant(value):
-    def _constant(seq):
-        return value
-    _constant._text = f"{value}"
-    return _constant
-
-
-#
-# Interactive stuff
+# Harnesses
 #
 
 
-def game_json(alphabet, length, num_samples, num_contracts):
-    setup = GameDefinition(alphabet, length, num_samples, num_contracts)
-    (contract_set, sample_set) = setup.paired_contracts_samples()
-    measurement_set = setup.random_measurements()
-
-    sample_names = (f"sample{i}" for i in itertools.count(1))
-    named_samples = list(zip(sample_names, sample_set))
+def emit_json(alphabet, length, num_samples, num_contracts, json_file):
+    game = game_json(alphabet, length, num_samples, num_contracts)
+    json_file.write(json.dumps(game))
 
-    answers = {sample_name: sample for (sample_name, sample) in named_samples}
 
-    measurement_values = {
-        sample_name: {
-            measurement._text: measurement(sample) for measurement in measurement_set
-        }
-        for (sample_name, sample) in named_samples
-    }
-
-    contract_values = {
-        sample_name: {contract._text: contract(sample) for contract in contract_set}
-        for (sample_name, sample) in named_samples
-    }
+def emit_snapshot(alphabet, length, directory=None):
+    """Write the universe snapshot, and the contract catalog if it fits."""
+    setup = GameDefinition(alphabet, length, 0, 0)
+    path = snapshot_path(alphabet, length, directory)
+    paths = [write_snapshot(path, alphabet, length, setup.contract_callables())]
+    if catalog_fits(alphabet, length):
+        universe = open_snapshot(path)
+        path = catalog_path(alphabet, length, directory)
+        paths.append(write_catalog(path, universe))
+    return paths
+
+
+def profile_games(alphabet, length, num_samples, num_contracts, num_games):
+    """Generate games and report where the time went."""
+    counters.clear()
+    stage_times.clear()
+    latencies = []
+    for _ in range(num_games):
+        start = time.perf_counter()
+        game_json(alphabet, length, num_samples, num_contracts)
+        latencies.append(time.perf_counter() - start)
 
     return {
-        "game": "0",
-        "answers": answers,
-        "measures": measurement_values,
-        "contracts": contract_values,
+        "games": num_games,
+        "total_s": sum(latencies),
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": max(latencies),
+        },
+        "stages_s": dict(stage_times.most_common()),
+        "counts": dict(counters.most_common()),
     }
 
 
-#
-# Harnesses
-#
+@contextmanager
+def collapsed_stacks(out, interval=0.001):
+    """Sample the stack every ``interval`` CPU seconds, as flamegraph input."""
+    samples = Counter()
 
+    def _sample(signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+            frame = frame.f_back
+        samples[";".join(reversed(stack))] += 1
 
-def emit_json(alphabet, length, num_samples, num_contracts, json_file):
-    game = game_json(alphabet, length, num_samples, num_contracts)
-    json_file.write(json.dumps(game))
+    previous = signal.signal(signal.SIGPROF, _sample)
+    signal.setitimer(signal.ITIMER_PROF, interval, interval)
+    try:
+        yield samples
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, previous)
+        for (stack, count) in samples.most_common():
+            out.write(f"{stack} {count}\n")
 
 
 def prepare_stage(json_data):
+    import tempfile
+
     stage_dir = tempfile.mkdtemp()
     os.system(f"cp -r client/out/* {stage_dir}")
     with open(f"{stage_dir}/game.json", "w") as f:
@@ -495,6 +157,91 @@ def single(alphabet, length, num_samples, num_contracts, output):
     emit_json(alphabet, length, num_samples, num_contracts, output)
 
 
+@main.command("snapshot")
+@click.option("--alphabet", default="ABCD")
+@click.option("--length", type=int, default=5)
+@click.option("--directory", default=None)
+def snapshot(alphabet, length, directory):
+    for path in emit_snapshot(alphabet, length, directory):
+        click.echo(path)
+
+
+@main.command("audit")
+@click.option("--alphabet", default="ABCD")
+@click.option("--length", type=int, default=5)
+@click.argument("games_dir", type=click.Path(exists=True, file_okay=False))
+def audit(alphabet, length, games_dir):
+    for name in sorted(os.listdir(games_dir)):
+        try:
+            with open(os.path.join(games_dir, name)) as f:
+                game = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if "measures" not in game:
+            continue
+        if game_alphabet(game) != alphabet.upper():
+            continue
+        if any(len(a) != length for a in game.get("answers", {}).values()):
+            continue
+        click.echo(json.dumps({name: audit_game(game, alphabet, length)}))
+
+
+@main.command("analyze")
+@click.option("--alphabet", default="ABCD")
+@click.option("--length", type=int, default=5)
+@click.option("--workers", type=int, default=None)
+@click.argument("games_dir", type=click.Path(exists=True, file_okay=False))
+@click.argument("output", type=click.Path(dir_okay=False))
+def analyze(alphabet, length, workers, games_dir, output):
+    summary = analyze_corpus(games_dir, output, alphabet, length, workers)
+    click.echo(json.dumps(summary, indent=2))
+
+
+@main.command("profile")
+@click.option("--num-samples", default=5)
+@click.option("--num-contracts", default=5)
+@click.option("--alphabet", default="ABCD")
+@click.option("--length", type=int, default=5)
+@click.option("--num-games", default=10)
+@click.option("--cprofile", type=click.Path(dir_okay=False), default=None)
+@click.option("--collapsed", type=click.File("w"), default=None)
+def profile(
+    alphabet, length, num_samples, num_contracts, num_games, cprofile, collapsed,
+):
+    with ExitStack() as stack:
+        if collapsed:
+            stack.enter_context(collapsed_stacks(collapsed))
+        if cprofile:
+            profiler = cProfile.Profile()
+            stack.callback(profiler.dump_stats, cprofile)
+            stack.enter_context(profiler)
+        report = profile_games(
+            alphabet, length, num_samples, num_contracts, num_games,
+        )
+
+    click.echo(json.dumps(report, indent=2))
+
+
+@main.command("import-budget")
+@click.option("--repeat", default=3)
+def import_budget(repeat):
+    failed = False
+    for (module, budget) in IMPORT_BUDGETS.items():
+        runs = [import_time(module) for _ in range(repeat)]
+        elapsed = min(e for (e, _) in runs)
+        loaded = sorted(set(m for (_, ms) in runs for m in ms))
+        ok = elapsed <= budget and not loaded
+        failed = failed or not ok
+        click.echo(json.dumps({
+            "module": module,
+            "seconds": elapsed,
+            "budget": budget,
+            "forbidden_loaded": loaded,
+            "ok": ok,
+        }))
+    sys.exit(1 if failed else 0)
+
+
 @main.command("upload")
 @click.option("--num-samples", default=5)
 @click.option("--num-contracts", default=5)
@@ -0,0 +1,56 @@
+import json
+import random
+
+import pytest
+
+pytest.importorskip("cytoolz")
+
+import generation  # noqa: E402
+from universe import Universe  # noqa: E402
+
+
+def _truth(contract, sequences):
+    return sum(
+        1 << i for (i, seq) in enumerate(sequences)
+        if contract(generation.featurize(seq)) is True
+    )
+
+
+@pytest.fixture
+def catalog_file(tmp_path):
+    path = str(tmp_path / "contracts.bin")
+    return generation.write_catalog(path, Universe("ABC", 4))
+
+
+def test_catalog_truth_tables_match_evaluation(catalog_file):
+    catalog = generation.open_catalog(catalog_file, "ABC", 4)
+    sequences = list(Universe("ABC", 4).sequences())
+
+    truths = set()
+    for i in range(len(catalog)):
+        contract = catalog.contract(i)
+        assert contract._truth == _truth(contract, sequences), contract._text
+        truths.add(contract._truth)
+    # Deduplicated, and without tautologies or contradictions
+    assert len(truths) == len(catalog)
+    assert not truths & {0, catalog.everything}
+
+    random.seed(0)
+    for _ in range(20):
+        contract = catalog.draw_and()
+        assert contract._truth == _truth(contract, sequences), contract._text
+
+
+def test_stale_catalogs_are_ignored(catalog_file):
+    assert generation.open_catalog(catalog_file, "ABD", 4) is None
+
+    with open(catalog_file, "rb") as f:
+        raw = f.read()
+    name = json.dumps(generation.GameDefinition(
+        "ABC", 4, 0, 0,
+    ).contract_callables()[0]._text).encode("utf-8")
+    stale = raw.replace(name, name[:1] + b"#" + name[2:], 1)
+    assert stale != raw
+    with open(catalog_file, "wb") as f:
+        f.write(stale)
+    assert generation.open_catalog(catalog_file, "ABC", 4) is None
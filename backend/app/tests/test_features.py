@@ -0,0 +1,53 @@
+import re
+
+import pytest
+
+pytest.importorskip("cytoolz")
+
+import generation  # noqa: E402
+from universe import Universe  # noqa: E402
+
+
+# The string-based measurements the featurized ones replaced
+
+
+def old_count_of(sub):
+    return lambda seq: len(re.findall(sub.upper(), seq.upper()))
+
+
+def old_count_of_exact(sub):
+    def _count_of_exact(seq):
+        subs = [seq[i:i + len(sub)] for i in range(len(seq) - len(sub) + 1)]
+        return subs.count(sub)
+    return _count_of_exact
+
+
+def old_at_positions(positions, char):
+    return lambda seq: len(
+        [seq[i] for i in positions if seq[i].upper() == char.upper()]
+    )
+
+
+@pytest.mark.parametrize("alphabet", ["ABCD", "AbC"])
+def test_featurized_measurements_match_string_versions(alphabet):
+    length = 5
+    sweep = generation.sweep_offsets(max_=length - 1)
+    pairs = []
+    for char in alphabet:
+        pairs.append((generation.count_of(char), old_count_of(char)))
+        for positions in sweep([0, 1, 2]) + [[0, length // 2, -1]]:
+            pairs.append((
+                generation.at_positions(length, positions, char),
+                old_at_positions(positions, char),
+            ))
+        for char2 in alphabet:
+            sub = char + char2
+            pairs.append((generation.count_of(sub), old_count_of(sub)))
+            pairs.append((generation.count_of_exact(sub), old_count_of_exact(sub)))
+        sub = char * 3
+        pairs.append((generation.count_of_exact(sub), old_count_of_exact(sub)))
+
+    for seq in Universe(alphabet, length).sequences():
+        for (new, old) in pairs:
+            assert new(seq) == old(seq), (new._text, seq)
+            assert new(generation.featurize(seq)) == old(seq), (new._text, seq)
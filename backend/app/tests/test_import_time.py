@@ -0,0 +1,19 @@
+import pytest
+
+from importtime import IMPORT_BUDGETS
+from importtime import import_time
+
+# Third-party packages each budgeted module needs to import at all
+REQUIRES = {"generation": ["cytoolz"], "main": ["cytoolz", "fastapi"]}
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_BUDGETS))
+def test_import_within_budget(module):
+    for requirement in REQUIRES.get(module, []):
+        pytest.importorskip(requirement)
+
+    budget = IMPORT_BUDGETS[module]
+    runs = [import_time(module) for _ in range(3)]
+
+    assert min(elapsed for (elapsed, _) in runs) <= budget
+    assert not any(loaded for (_, loaded) in runs)
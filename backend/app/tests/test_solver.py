@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+pytest.importorskip("cytoolz")
+
+import generation  # noqa: E402
+from solver import MeasurementIndex  # noqa: E402
+from universe import Universe  # noqa: E402
+
+
+def test_index_counts_match_brute_force():
+    (alphabet, length) = ("ABC", 5)
+    universe = Universe(alphabet, length)
+    callables = generation.GameDefinition(
+        alphabet, length, 0, 0,
+    ).measurement_callables()
+    index = MeasurementIndex(universe, callables)
+    sequences = list(universe.sequences())
+
+    rng = random.Random(0)
+    for _ in range(50):
+        answer = rng.choice(sequences)
+        revealed = rng.sample(callables, 4)
+        measures = {f._text: f(answer) for f in revealed}
+        expected = sum(
+            1 for seq in sequences
+            if all(f(seq) == measures[f._text] for f in revealed)
+        )
+        assert index.count(measures) == expected >= 1
+
+
+def test_audit_counts_match_brute_force():
+    (alphabet, length) = ("ABC", 4)
+    random.seed(0)
+    game = generation.game_json(alphabet, length, 3, 3)
+    callables = {
+        f._text: f for f in generation.GameDefinition(
+            alphabet, length, 0, 0,
+        ).measurement_callables()
+    }
+    sequences = list(Universe(alphabet, length).sequences())
+
+    candidates = generation.audit_game(game, alphabet, length)
+    for (sample_name, measures) in game["measures"].items():
+        expected = sum(
+            1 for seq in sequences
+            if all(callables[t](seq) == v for (t, v) in measures.items())
+        )
+        assert candidates[sample_name] == expected >= 1
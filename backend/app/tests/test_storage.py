@@ -0,0 +1,34 @@
+import asyncio
+import os
+import stat
+
+import storage
+
+
+def test_no_torn_reads_under_concurrent_writers(tmp_path):
+    assert storage.stress(str(tmp_path), num_ops=200) == 0
+
+
+def test_written_documents_get_umask_permissions(tmp_path):
+    path = str(tmp_path / "doc")
+    storage.write_json(path, {"a": 1})
+    mode = stat.S_IMODE(os.stat(path).st_mode)
+    assert mode == 0o666 & ~storage._UMASK
+    assert storage.read_json(path) == {"a": 1}
+
+
+def test_listing_hides_temporary_files(tmp_path):
+    (tmp_path / f"{storage.TEMP_PREFIX}abc").write_text("{")
+    (tmp_path / "game").write_text("{}")
+
+    async def _names():
+        return [n async for names in storage.aiter_dir(str(tmp_path)) for n in names]
+
+    assert asyncio.run(_names()) == ["game"]
+
+
+def test_looks_like_json_rejects_logs(tmp_path):
+    (tmp_path / "scores.log").write_text("abc 10\n")
+    storage.write_json(str(tmp_path / "game"), {"a": [1, 2]})
+    assert not storage.looks_like_json(str(tmp_path / "scores.log"))
+    assert storage.looks_like_json(str(tmp_path / "game"))
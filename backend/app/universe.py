@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+
+"""Precomputed sequence universe, shareable between processes.
+
+The universe for an (alphabet, length) pair is every sequence of that length
+over the alphabet, in ``itertools.product`` order, along with a value column
+for each measurement callable.  It can be written once to a versioned
+snapshot file, which processes then ``mmap`` read-only, so that the pages are
+shared through the OS page cache instead of being rebuilt per process.  When
+there is no snapshot, columns are computed lazily and kept in memory.
+"""
+
+
+import itertools
+import json
+import mmap
+import os
+import struct
+
+
+SNAPSHOT_MAGIC = b"SGUNIV"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DIR = os.environ.get(
+    "STRING_GUESSING_SNAPSHOT_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "string-guessing"),
+)
+
+# magic, version, header length
+_PREAMBLE = struct.Struct("<6sII")
+
+
+class Universe:
+    """All sequences of a given length over an alphabet, with value columns."""
+
+    def __init__(self, alphabet, length, columns=None, symbols=None):
+        self.alphabet = alphabet
+        self.length = length
+        self.size = len(alphabet) ** length
+        self._columns = dict(columns or {})
+        self._symbols = symbols
+
+    def sequence(self, index):
+        """Return the sequence at ``index`` in ``itertools.product`` order."""
+        if self._symbols is not None:
+            start = index * self.length
+            row = self._symbols[start:start + self.length]
+            return "".join(self.alphabet[s] for s in row)
+
+        chars = []
+        base = len(self.alphabet)
+        for _ in range(self.length):
+            (index, digit) = divmod(index, base)
+            chars.append(self.alphabet[digit])
+        return "".join(reversed(chars))
+
+    def sequences(self):
+        """Iterate over every sequence of the universe."""
+        if self._symbols is not None:
+            return (self.sequence(i) for i in range(self.size))
+        return (
+            "".join(p) for p in itertools.product(*[self.alphabet] * self.length)
+        )
+
+    def column(self, func):
+        """Return the values of ``func`` over the universe, indexed by sequence.
+
+        Columns missing from the snapshot (e.g. for contracts, which are
+        random compositions) are computed on first use and kept in memory.
+        """
+        text = func._text
+        if text not in self._columns:
+            self._columns[text] = tuple(func(seq) for seq in self.sequences())
+        return self._columns[text]
+
+
+def snapshot_path(alphabet, length, directory=None):
+    """Where the snapshot for this (alphabet, length) lives."""
+    name = f"universe-v{SNAPSHOT_VERSION}-{_tag(alphabet)}-{length}.bin"
+    return os.path.join(directory or SNAPSHOT_DIR, name)
+
+
+def catalog_path(alphabet, length, directory=None):
+    """Where the contract catalog for this (alphabet, length) lives."""
+    name = f"contracts-{_tag(alphabet)}-{length}.bin"
+    return os.path.join(directory or SNAPSHOT_DIR, name)
+
+
+def _tag(alphabet):
+    # Alphabets come from API requests, so keep odd ones out of the path
+    return alphabet if alphabet.isalnum() else alphabet.encode("utf-8").hex()
+
+
+def write_snapshot(path, alphabet, length, callables):
+    """Compute the universe for ``callables`` and write it to ``path``."""
+    if len(alphabet) > 256 or length > 255:
+        raise ValueError("Snapshots only support byte-sized symbols and values")
+
+    universe = Universe(alphabet, length)
+    texts = list(dict.fromkeys(c._text for c in callables))
+    by_text = {c._text: c for c in callables}
+
+    symbol_of = {char: i for (i, char) in enumerate(alphabet)}
+    symbols = bytes(
+        symbol_of[char] for seq in universe.sequences() for char in seq
+    )
+    header = json.dumps({
+        "alphabet": alphabet,
+        "length": length,
+        "size": universe.size,
+        "columns": texts,
+    }).encode("utf-8")
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        f.write(symbols)
+        for text in texts:
+            f.write(bytes(int(v) for v in universe.column(by_text[text])))
+    os.replace(tmp_path, path)
+    return path
+
+
+def open_snapshot(path):
+    """Map a snapshot read-only, or return None if it is missing or stale."""
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    if len(mapped) < _PREAMBLE.size:
+        return None
+    (magic, version, header_len) = _PREAMBLE.unpack_from(mapped)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        return None
+
+    offset = _PREAMBLE.size
+    header = json.loads(bytes(mapped[offset:offset + header_len]))
+    offset += header_len
+
+    view = memoryview(mapped)
+    size = header["size"]
+    symbols_len = size * header["length"]
+    symbols = view[offset:offset + symbols_len]
+    offset += symbols_len
+
+    columns = {}
+    for text in header["columns"]:
+        columns[text] = view[offset:offset + size]
+        offset += size
+
+    if offset != len(mapped):
+        return None
+
+    return Universe(header["alphabet"], header["length"], columns, symbols)